@@ -1,23 +1,120 @@
 """Airtable read/write helpers for Products and Price History tables."""
 
+import logging
+import re
+import threading
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Iterator, Optional
 
-from pyairtable import Api
+import requests
+from pyairtable import Api, Table
+from requests.adapters import HTTPAdapter
 
 import config
+from ratelimit import RateLimiter, parse_retry_after
+from state import WriteJournal, run_window
+
+log = logging.getLogger(__name__)
+
+# Shared Api (one HTTP session) and Table instances, created lazily on first use
+_api: Optional[Api] = None
+_tables: dict[str, Table] = {}
+_lock = threading.Lock()
+
+# Every Airtable request in the process is paced through this one limiter
+_limiter = RateLimiter(config.AIRTABLE_RATE)
+
+
+class _RateLimitedAdapter(HTTPAdapter):
+    """Transport adapter that paces requests through the shared limiter.
+
+    On a 429 the limiter is paused for the lockout window (Retry-After, or
+    config.AIRTABLE_429_PENALTY seconds) so every writer waits it out, then
+    the request is resent.
+    """
+
+    def send(self, request, **kwargs):
+        for _ in range(config.AIRTABLE_429_RETRIES + 1):
+            _limiter.acquire()
+            response = super().send(request, **kwargs)
+            if response.status_code != 429:
+                break
+            penalty = parse_retry_after(response.headers.get("Retry-After"))
+            if penalty is None:
+                penalty = config.AIRTABLE_429_PENALTY
+            log.warning("Airtable rate limit hit; pausing all requests for %.0fs.", penalty)
+            _limiter.pause(penalty)
+        return response
 
 
 def _get_api() -> Api:
-    return Api(config.AIRTABLE_API_KEY)
+    global _api
+    if _api is None:
+        with _lock:
+            if _api is None:
+                # pyairtable's own 429 retries would hammer the API during the
+                # lockout, so retrying is left to _RateLimitedAdapter instead
+                api = Api(config.AIRTABLE_API_KEY, retry_strategy=None)
+                adapter = _RateLimitedAdapter()
+                api.session.mount("https://", adapter)
+                api.session.mount("http://", adapter)
+                _api = api
+    return _api
+
+
+def _table(name: str) -> Table:
+    table = _tables.get(name)
+    if table is None:
+        api = _get_api()
+        with _lock:
+            table = _tables.get(name)
+            if table is None:
+                table = _tables[name] = api.table(config.AIRTABLE_BASE_ID, name)
+    return table
+
+
+def _products_table() -> Table:
+    return _table(config.PRODUCTS_TABLE)
+
+
+def _price_history_table() -> Table:
+    return _table(config.PRICE_HISTORY_TABLE)
+
+
+def close() -> None:
+    """Close the shared Airtable session. The next call opens a fresh one."""
+    global _api
+    with _lock:
+        if _api is not None:
+            _api.session.close()
+        _api = None
+        _tables.clear()
+
 
+# Optional fields found missing from their table, so later calls leave them out
+_missing_fields: set[tuple[str, str]] = set()
 
-def _products_table():
-    return _get_api().table(config.AIRTABLE_BASE_ID, config.PRODUCTS_TABLE)
 
+def _is_missing(table: Table, field_name: str) -> bool:
+    return (table.name, field_name) in _missing_fields
 
-def _price_history_table():
-    return _get_api().table(config.AIRTABLE_BASE_ID, config.PRICE_HISTORY_TABLE)
+
+def _known_fields(table: Table, fields: dict) -> dict:
+    """Drop fields already found missing from the table."""
+    return {k: v for k, v in fields.items() if not _is_missing(table, k)}
+
+
+def _unknown_field(exc: Exception) -> Optional[str]:
+    """Return the field name if exc is Airtable's UNKNOWN_FIELD_NAME error."""
+    response = getattr(exc, "response", None)
+    if not isinstance(exc, requests.HTTPError) or response is None or response.status_code != 422:
+        return None
+    try:
+        message = response.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    match = re.search(r'Unknown field name: "(.+)"', message)
+    return match.group(1) if match else None
 
 
 # ---------------------------------------------------------------------------
@@ -25,14 +122,75 @@ def _price_history_table():
 # ---------------------------------------------------------------------------
 
 
-def get_all_products() -> list[dict]:
-    """Return all rows from the Products table."""
-    return _products_table().all()
+# Default field projections, so list calls skip long text and attachments
+PRODUCT_FIELDS = ["Name", "Shopify Handle", "URL", "Vendor", "Current Price", "Monitor"]
+# Fields main.check_product reads from each monitored product (Last Checked
+# and Last Price Change so unchanged updates can be skipped)
+MONITOR_FIELDS = ["Name", "Shopify Handle", "Current Price", "Last Checked", "Last Price Change"]
+
 
+def _iterate(table: Table, fields: Optional[list[str]], **options) -> Iterator[list[dict]]:
+    """table.iterate() with an optional field projection.
 
-def get_monitored_products() -> list[dict]:
-    """Return only products where the Monitor checkbox is checked."""
-    return _products_table().all(formula="{Monitor}")
+    Optional fields may not exist in every base. If Airtable rejects one
+    (422 UNKNOWN_FIELD_NAME), it is dropped from the projection and the
+    query retried; any other 422 falls back to fetching all fields.
+    """
+    while True:
+        wanted = [f for f in fields or [] if not _is_missing(table, f)]
+        pages = table.iterate(fields=wanted, **options) if wanted else table.iterate(**options)
+        try:
+            first = next(pages, None)
+        except requests.HTTPError as exc:
+            if not wanted or exc.response is None or exc.response.status_code != 422:
+                raise
+            name = _unknown_field(exc)
+            if name is None or _is_missing(table, name):
+                log.warning("Field projection rejected, fetching all fields: %s", exc)
+                fields = None
+            else:
+                log.warning("Table has no '%s' field; leaving it out of queries.", name)
+                _missing_fields.add((table.name, name))
+            continue
+        if first is not None:
+            yield first
+            yield from pages
+        return
+
+
+def _all(table: Table, fields: Optional[list[str]], **options) -> list[dict]:
+    """table.all() with the same field projection handling as _iterate()."""
+    return [record for page in _iterate(table, fields, **options) for record in page]
+
+
+def get_all_products(fields: Optional[list[str]] = PRODUCT_FIELDS) -> list[dict]:
+    """Return all rows from the Products table.
+
+    Args:
+        fields: Only return these fields. Pass None for every field.
+    """
+    return _all(_products_table(), fields)
+
+
+def get_monitored_products(fields: Optional[list[str]] = MONITOR_FIELDS) -> list[dict]:
+    """Return only products where the Monitor checkbox is checked.
+
+    Args:
+        fields: Only return these fields. Pass None for every field.
+    """
+    return _all(_products_table(), fields, formula="{Monitor}")
+
+
+def iter_monitored_products(fields: Optional[list[str]] = MONITOR_FIELDS) -> Iterator[list[dict]]:
+    """Yield monitored products one API page (up to 100 records) at a time.
+
+    Lets callers start work on the first page while later pages are still
+    loading.
+
+    Args:
+        fields: Only return these fields. Pass None for every field.
+    """
+    return _iterate(_products_table(), fields, formula="{Monitor}")
 
 
 def get_product_by_handle(handle: str) -> Optional[dict]:
@@ -43,6 +201,90 @@ def get_product_by_handle(handle: str) -> Optional[dict]:
     return records[0] if records else None
 
 
+def get_handle_index() -> dict[str, dict]:
+    """Return every product keyed by Shopify Handle, fetching only that field."""
+    index = {}
+    for record in _products_table().all(fields=["Shopify Handle"]):
+        handle = record["fields"].get("Shopify Handle")
+        if handle:
+            index[handle] = record
+    return index
+
+
+def get_last_checked(record_ids: list[str]) -> dict[str, Optional[str]]:
+    """Return the Last Checked date of each product that still exists.
+
+    Args:
+        record_ids: Airtable record IDs of products.
+
+    Returns:
+        Last Checked (YYYY-MM-DD, or None if empty) keyed by record ID.
+        Deleted products are left out.
+    """
+    ids = list(dict.fromkeys(record_ids))
+    last_checked = {}
+    # Keep each filterByFormula short enough for a GET request
+    for i in range(0, len(ids), 50):
+        formula = "OR(" + ",".join(f"RECORD_ID()='{rid}'" for rid in ids[i:i + 50]) + ")"
+        for record in _all(_products_table(), ["Last Checked"], formula=formula):
+            last_checked[record["id"]] = record["fields"].get("Last Checked")
+    return last_checked
+
+
+def create_products(products: list[dict]) -> list[dict]:
+    """Create many new products, up to 10 per API request.
+
+    New products are created with Monitor unchecked so the user can opt in.
+
+    Args:
+        products: One dict per product, with upsert_product()'s arguments
+            (name, handle, url, price and optionally vendor).
+
+    Returns:
+        The created Airtable records.
+    """
+    if not products:
+        return []
+
+    records = []
+    for p in products:
+        fields = {
+            "Name": p["name"],
+            "Shopify Handle": p["handle"],
+            "URL": p["url"],
+            "Current Price": p["price"],
+        }
+        if p.get("vendor"):
+            fields["Vendor"] = p["vendor"]
+        records.append(fields)
+
+    table = _products_table()
+    created = []
+    # Chunked here rather than by batch_create, so a failure never resends
+    # (and duplicates) chunks that were already created
+    for i in range(0, len(records), config.AIRTABLE_BATCH_SIZE):
+        created += _batch_create_tolerant(table, records[i:i + config.AIRTABLE_BATCH_SIZE])
+    return created
+
+
+def _batch_create_tolerant(table: Table, records: list[dict]) -> list[dict]:
+    """batch_create for one chunk that drops optional fields the table doesn't have.
+
+    Name, Shopify Handle and URL are required. Any other error is raised.
+    """
+    essentials = ("Name", "Shopify Handle", "URL")
+    while True:
+        records = [_known_fields(table, r) for r in records]
+        try:
+            return table.batch_create(records)
+        except requests.HTTPError as exc:
+            name = _unknown_field(exc)
+            if name is None or name in essentials or _is_missing(table, name):
+                raise
+            log.warning("Table has no '%s' field; leaving it out of new products.", name)
+            _missing_fields.add((table.name, name))
+
+
 def upsert_product(name: str, handle: str, url: str, price: float, vendor: str = "") -> dict:
     """Create a product if it doesn't exist, or return the existing record.
 
@@ -77,21 +319,114 @@ def _format_date(dt: datetime) -> str:
     return dt.strftime("%Y-%m-%d")
 
 
-def update_product(record_id: str, price: float, checked_at: datetime = None):
+def _batch_update_tolerant(table: Table, records: list[dict]) -> None:
+    """batch_update that drops fields the table doesn't have and retries.
+
+    Any other error is raised.
+    """
+    while True:
+        records = [
+            {"id": r["id"], "fields": _known_fields(table, r["fields"])}
+            for r in records
+        ]
+        records = [r for r in records if r["fields"]]
+        if not records:
+            return
+        try:
+            table.batch_update(records)
+            return
+        except requests.HTTPError as exc:
+            name = _unknown_field(exc)
+            if name is None or _is_missing(table, name):
+                raise
+            log.warning("Table has no '%s' field; leaving it out of updates.", name)
+            _missing_fields.add((table.name, name))
+
+
+def changed_fields(record_fields: dict, fields: dict) -> dict:
+    """Return the subset of `fields` whose values differ from a record's.
+
+    Airtable leaves empty fields and unticked checkboxes out of records, so
+    a field missing from `record_fields` matches None, False or "".
+    """
+    def _empty(value) -> bool:
+        return value is None or value is False or value == ""
+
+    return {
+        name: value for name, value in fields.items()
+        if (record_fields[name] != value if name in record_fields else not _empty(value))
+    }
+
+
+def _product_update_fields(price: float, checked_at: datetime = None, fields: dict = None) -> dict:
+    """Build the Products fields written for one check.
+
+    Fields already found missing from the table are left out, so they are
+    neither sent nor counted as changed against records that lack them.
+    """
+    return _known_fields(_products_table(), {
+        "Current Price": price,
+        "Last Checked": _format_date(checked_at or datetime.now(timezone.utc)),
+        **(fields or {}),
+    })
+
+
+def update_product(
+    record_id: str,
+    price: float,
+    checked_at: datetime = None,
+    fields: dict = None,
+    current: dict = None,
+):
     """Update a product's Current Price and Last Checked timestamp.
 
-    Only writes fields that exist in the table; silently skips missing fields.
+    Args:
+        record_id: Airtable record ID of the product.
+        price: The current price just fetched.
+        checked_at: Timestamp of the check. Defaults to now (UTC).
+        fields: Other Products fields to set in the same request.
+        current: The record's fields as last read. If given, only fields
+            whose value changed are sent, and nothing at all if none did.
+            Last Checked stores a date, so it changes at most once a day.
+
+    Only writes fields that exist in the table; missing fields are skipped.
+    Any other failure is raised.
     """
-    checked_at = checked_at or datetime.now(timezone.utc)
-    fields = {}
-    # These fields are optional — only set if they exist in the table
-    fields["Current Price"] = price
-    fields["Last Checked"] = _format_date(checked_at)
-    try:
-        _products_table().update(record_id, fields)
-    except Exception:
-        # If fields don't exist, just skip the update
-        pass
+    update = _product_update_fields(price, checked_at, fields)
+    if current is not None:
+        update = changed_fields(current, update)
+    if update:
+        update_product_fields([(record_id, update)])
+
+
+def update_products(updates: list[tuple]) -> None:
+    """Batch version of update_product(), up to 10 records per API request.
+
+    Args:
+        updates: (record_id, price, checked_at) tuples, optionally with a
+            fourth element of extra fields. checked_at may be None for now.
+
+    Like update_product(), fields missing from the table are skipped and any
+    other failure is raised.
+    """
+    update_product_fields([
+        (record_id, _product_update_fields(price, checked_at, rest[0] if rest else None))
+        for record_id, price, checked_at, *rest in updates
+    ])
+
+
+def update_product_fields(updates: list[tuple[str, dict]]) -> None:
+    """Write arbitrary Products fields, up to 10 records per API request.
+
+    Args:
+        updates: (record_id, fields) tuples.
+
+    Fields missing from the table are skipped and any other failure is raised.
+    """
+    records = [{"id": record_id, "fields": fields} for record_id, fields in updates]
+    table = _products_table()
+    for i in range(0, len(records), config.AIRTABLE_BATCH_SIZE):
+        _batch_update_tolerant(table, records[i:i + config.AIRTABLE_BATCH_SIZE])
 
 
 # ---------------------------------------------------------------------------
@@ -99,14 +434,32 @@ def update_product(record_id: str, price: float, checked_at: datetime = None):
 # ---------------------------------------------------------------------------
 
 
+def make_check_key(product_record_id: str, checked_at: datetime = None, window: int = None) -> str:
+    """Deterministic Price History key: the product plus the run window of the check.
+
+    Args:
+        product_record_id: Airtable record ID of the product.
+        checked_at: Timestamp of the check. Defaults to now (UTC).
+        window: Run window length in seconds. Defaults to config.CHECK_INTERVAL.
+    """
+    checked_at = checked_at or datetime.now(timezone.utc)
+    return f"{product_record_id}:{run_window(window or config.CHECK_INTERVAL, checked_at.timestamp())}"
+
+
 def log_price_check(
     product_record_id: str,
     price: float,
     previous_price: Optional[float],
     price_dropped: bool = False,
     checked_at: datetime = None,
+    check_key: str = None,
 ) -> dict:
-    """Create a new row in the Price History table.
+    """Record a check in the Price History table.
+
+    Rows are keyed on their Check Key, so logging the same check twice (a
+    retry, or overlapping runs in one window) keeps the existing row rather
+    than adding a duplicate. An existing row is only overwritten to record
+    a price drop it lacks, so a later check never erases a drop.
 
     Args:
         product_record_id: Airtable record ID of the product (for the linked field).
@@ -115,10 +468,30 @@ def log_price_check(
         price_dropped: Whether the price decreased since the last check.
             Airtable automations can trigger on this flag to send notifications.
         checked_at: Timestamp of the check. Defaults to now (UTC).
+        check_key: Idempotency key. Defaults to make_check_key() for this product and time.
 
     Returns:
-        The created Airtable record.
+        The created, updated or already existing Airtable record.
     """
+    return log_price_checks([{
+        "product_record_id": product_record_id,
+        "price": price,
+        "previous_price": previous_price,
+        "price_dropped": price_dropped,
+        "checked_at": checked_at,
+        "check_key": check_key,
+    }])[0]
+
+
+def _history_fields(
+    product_record_id: str,
+    price: float,
+    previous_price: Optional[float],
+    price_dropped: bool = False,
+    checked_at: datetime = None,
+    check_key: str = None,
+) -> dict:
+    """Build the Price History fields for one check."""
     checked_at = checked_at or datetime.now(timezone.utc)
 
     fields = {
@@ -126,8 +499,317 @@ def log_price_check(
         "Price": price,
         "Checked At": _format_date(checked_at),
         "Price Dropped": price_dropped,
+        "Check Key": check_key or make_check_key(product_record_id, checked_at),
     }
     if previous_price is not None:
         fields["Previous Price"] = previous_price
+    return fields
+
+
+def _records_drop(existing: dict, fields: dict) -> bool:
+    """True if `fields` records a price drop that the existing row doesn't."""
+    return bool(fields.get("Price Dropped")) and not existing.get("Price Dropped")
+
+
+def _find_check_keys(table: Table, keys: list[str]) -> Optional[dict[str, dict]]:
+    """Return existing Price History rows keyed by Check Key.
+
+    Only the Check Key and Price Dropped fields are fetched.
+
+    Returns None if the table has no Check Key field.
+    """
+    if _is_missing(table, "Check Key"):
+        return None
+    formula = "OR(" + ",".join(f"{{Check Key}}='{key}'" for key in keys) + ")"
+    try:
+        records = table.all(formula=formula, fields=["Check Key", "Price Dropped"])
+    except requests.HTTPError as exc:
+        # A formula naming a missing field fails with INVALID_FILTER_BY_FORMULA
+        response = exc.response
+        if response is None or response.status_code != 422 or "check key" not in response.text.lower():
+            raise
+        log.warning("Price History has no 'Check Key' field; history writes are not idempotent.")
+        _missing_fields.add((table.name, "Check Key"))
+        return None
+    return {r["fields"]["Check Key"]: r for r in records if r["fields"].get("Check Key")}
+
+
+def log_price_checks(checks: list[dict]) -> list[dict]:
+    """Record many checks in Price History, up to 10 per API request.
+
+    Keyed on Check Key like log_price_check(): rows whose key already exists
+    are left alone unless the new check records a price drop the row lacks.
+    Overlapping runs can still race to create the same key, which adds a
+    duplicate row but never loses one. If the table has no Check Key field,
+    rows are plainly created instead.
+
+    Args:
+        checks: One dict per row, with the same keys as log_price_check()'s arguments.
+
+    Returns:
+        The created, updated or already existing Airtable records. Existing
+        rows left alone carry only their Check Key and Price Dropped fields.
+    """
+    # Within a batch, the first check of a key wins unless a later one records a drop
+    rows: dict[str, dict] = {}
+    for fields in (_history_fields(**c) for c in checks):
+        key = fields["Check Key"]
+        if key not in rows or _records_drop(rows[key], fields):
+            rows[key] = fields
+
+    table = _price_history_table()
+    records = []
+    keys = list(rows)
+    for i in range(0, len(keys), config.AIRTABLE_BATCH_SIZE):
+        batch = keys[i:i + config.AIRTABLE_BATCH_SIZE]
+        existing = _find_check_keys(table, batch)
+        if existing is None:
+            records += table.batch_create([
+                {k: v for k, v in rows[key].items() if k != "Check Key"} for key in batch
+            ])
+            continue
+        create = [rows[key] for key in batch if key not in existing]
+        upgrade = [
+            {"id": existing[key]["id"], "fields": rows[key]}
+            for key in batch
+            if key in existing and _records_drop(existing[key]["fields"], rows[key])
+        ]
+        upgraded = {r["id"] for r in upgrade}
+        records += [r for key, r in existing.items() if r["id"] not in upgraded]
+        if create:
+            records += table.batch_create(create)
+        if upgrade:
+            records += table.batch_update(upgrade)
+    return records
+
+
+# ---------------------------------------------------------------------------
+# Buffered writes
+# ---------------------------------------------------------------------------
+
+
+class PriceCheckWriter:
+    """Buffers Price History rows and product updates and writes them in batches.
+
+    Each buffer is sent whenever it reaches `batch_size`, and on flush().
+    A failed batch is logged and counted in `failed` rather than raised, so
+    one bad batch does not abort the run. Safe to share between threads.
+
+    With a `journal`, every queued write is appended to it first and only
+    removed once Airtable has accepted it; replay() resends whatever an
+    earlier run could not write.
+
+    If given, `on_written` is called with the product record IDs of each
+    product update batch once it has been written, and straight away for an
+    update skipped because nothing changed. It is not called for writes
+    resent by replay(), which belong to an earlier run. Every check goes through
+    update_product(), whereas a history row may be skipped (see
+    main.evaluate_product). `unchanged` counts the skipped updates.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        on_written: Callable[[list[str]], None] = None,
+        journal: WriteJournal = None,
+    ):
+        self.batch_size = batch_size or config.AIRTABLE_BATCH_SIZE
+        self.on_written = on_written
+        self.journal = journal
+        self.failed = 0
+        self.unchanged = 0
+        # Buffered (journal id, payload) pairs; the id is None without a journal
+        self._history: list[tuple[Optional[int], dict]] = []
+        self._updates: list[tuple[Optional[int], dict]] = []
+        self._lock = threading.Lock()
+
+    def log_price_check(self, **check) -> None:
+        """Queue a Price History row. Accepts log_price_check()'s arguments."""
+        self._queue(self._history, "history", check, self._write_history)
+
+    def update_product(
+        self,
+        record_id: str,
+        price: float,
+        checked_at: datetime = None,
+        fields: dict = None,
+        current: dict = None,
+    ) -> None:
+        """Queue a product update. Accepts update_product()'s arguments."""
+        checked_at = checked_at or datetime.now(timezone.utc)
+        update = _product_update_fields(price, checked_at, fields)
+        if current is not None:
+            update = changed_fields(current, update)
+        if not update:
+            with self._lock:
+                self.unchanged += 1
+            if self.on_written is not None:
+                self.on_written([record_id])
+            return
+        # checked_at lets replay() tell whether a newer write has landed since
+        payload = {"record_id": record_id, "checked_at": checked_at, "fields": update}
+        self._queue(self._updates, "update", payload, self._write_updates)
+
+    def _queue(self, buffer: list, kind: str, payload: dict, write: Callable) -> None:
+        entry_id = self.journal.append(kind, _to_json(payload)) if self.journal else None
+        with self._lock:
+            buffer.append((entry_id, payload))
+            if len(buffer) < self.batch_size:
+                return
+            batch = buffer[:]
+            buffer.clear()
+        write(batch)
+
+    def flush(self) -> None:
+        """Write everything still buffered."""
+        with self._lock:
+            history, self._history = self._history, []
+            updates, self._updates = self._updates, []
+        self._write_history(history)
+        self._write_updates(updates)
+
+    def replay(self, window: int = None) -> int:
+        """Resend writes left in the journal by earlier runs. Returns how many succeeded.
+
+        Args:
+            window: Run window length in seconds. Replayed updates checked
+                within the current window are passed to `on_written` like new
+                writes, so a restart in the same window doesn't refetch those
+                products. Older ones are not. Defaults to config.CHECK_INTERVAL.
+
+        Product updates that have been superseded are dropped instead: those
+        for deleted products, older updates to the same product, and any
+        made on a day before the product's current Last Checked date. Last
+        Checked only stores a date, so same-day updates are always resent.
+        """
+        if not self.journal:
+            return 0
+        failed_before = self.failed
+        pending = self.journal.pending()
+        history = [(entry_id, _from_json(payload)) for entry_id, kind, payload in pending if kind == "history"]
+        updates = [(entry_id, _from_json(payload)) for entry_id, kind, payload in pending if kind == "update"]
+        current, stale = self._drop_stale(updates)
+        length = window or config.CHECK_INTERVAL
+        this_window = run_window(length)
+
+        def _in_window(entry: tuple[Optional[int], dict]) -> bool:
+            checked_at = entry[1].get("checked_at")
+            return checked_at is not None and run_window(length, checked_at.timestamp()) == this_window
+
+        for i in range(0, len(history), self.batch_size):
+            self._write_history(history[i:i + self.batch_size])
+        for mark in (True, False):
+            batch = [entry for entry in current if _in_window(entry) == mark]
+            for i in range(0, len(batch), self.batch_size):
+                self._write_updates(batch[i:i + self.batch_size], mark=mark)
+        return len(pending) - stale - (self.failed - failed_before)
+
+    def _drop_stale(self, updates: list[tuple[Optional[int], dict]]) -> tuple[list, int]:
+        """Split journaled updates into those still worth sending and a count of the rest."""
+        if not updates:
+            return [], 0
+        try:
+            last_checked = get_last_checked([u["record_id"] for _, u in updates])
+        except Exception as exc:
+            log.warning("Could not read Last Checked for journaled updates, resending all: %s", exc)
+            return updates, 0
+
+        # Newest first, so only the latest update per product survives
+        updates = sorted(
+            updates,
+            key=lambda entry: entry[1]["checked_at"].timestamp() if entry[1].get("checked_at") else 0,
+            reverse=True,
+        )
+        current, stale, seen = [], [], set()
+        for entry in updates:
+            update = entry[1]
+            record_id, checked_at = update["record_id"], update.get("checked_at")
+            superseded = (
+                record_id in seen
+                or record_id not in last_checked
+                or (checked_at is not None and (last_checked[record_id] or "") > _format_date(checked_at))
+            )
+            seen.add(record_id)
+            (stale if superseded else current).append(entry)
+        if stale:
+            log.info("Dropped %d journaled product update(s) superseded by newer writes.", len(stale))
+            self._forget(stale)
+        return current, len(stale)
+
+    def _write_history(self, batch: list[tuple[Optional[int], dict]]) -> None:
+        self._send(batch, log_price_checks, "Price History row(s)")
+
+    def _write_updates(self, batch: list[tuple[Optional[int], dict]], mark: bool = True) -> None:
+        def _send_updates(updates: list[dict]) -> None:
+            # Updates journaled by older versions carry the price instead of built fields
+            update_product_fields([
+                (u["record_id"], _product_update_fields(u["price"], u["checked_at"], u.get("fields")) if "price" in u else u["fields"])
+                for u in updates
+            ])
+
+        written = self._send(batch, _send_updates, "product update(s)")
+        if written and mark and self.on_written is not None:
+            self.on_written([update["record_id"] for _, update in written])
+
+    def _send(self, batch: list[tuple[Optional[int], dict]], send: Callable, what: str) -> list:
+        """Send one batch and return the entries Airtable accepted."""
+        if not batch:
+            return []
+        try:
+            send([payload for _, payload in batch])
+        except Exception as exc:
+            if not _is_permanent(exc):
+                kept = " (kept in journal for the next run)" if self.journal else ""
+                log.error("Failed to write %d %s%s: %s", len(batch), what, kept, exc)
+                self._count_failed(batch)
+                return []
+            if len(batch) > 1:
+                # Resend one by one so a single rejected record doesn't sink the batch
+                return [entry for single in batch for entry in self._send([single], send, what)]
+            log.error("Airtable rejected %d %s, dropping it: %s", len(batch), what, exc)
+            self._count_failed(batch)
+            self._forget(batch)
+            return []
+        self._forget(batch)
+        return batch
+
+    def _count_failed(self, batch: list) -> None:
+        with self._lock:
+            self.failed += len(batch)
+
+    def _forget(self, batch: list[tuple[Optional[int], dict]]) -> None:
+        """Remove entries from the journal once they no longer need replaying."""
+        if self.journal:
+            self.journal.remove([entry_id for entry_id, _ in batch])
+
+    def __enter__(self) -> "PriceCheckWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+
+def _is_permanent(exc: Exception) -> bool:
+    """True for per-record validation errors (400, 422) that a retry won't fix.
+
+    Other client errors, such as a revoked token (401/403) or a renamed
+    table (404), affect every write alike, so they are kept for replay.
+    """
+    response = getattr(exc, "response", None)
+    return (
+        isinstance(exc, requests.HTTPError)
+        and response is not None
+        and response.status_code in (400, 422)
+    )
+
+
+def _to_json(payload: dict) -> dict:
+    """Make a queued write JSON-serialisable for the journal."""
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in payload.items()}
+
 
-    return _price_history_table().create(fields)
+def _from_json(payload: dict) -> dict:
+    """Inverse of _to_json()."""
+    if payload.get("checked_at"):
+        payload = {**payload, "checked_at": datetime.fromisoformat(payload["checked_at"])}
+    return payload
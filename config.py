@@ -8,6 +8,55 @@ AIRTABLE_API_KEY = os.environ["AIRTABLE_API_KEY"]
 AIRTABLE_BASE_ID = os.environ["AIRTABLE_BASE_ID"]
 PRODUCTS_TABLE = os.getenv("AIRTABLE_PRODUCTS_TABLE", "Products")
 PRICE_HISTORY_TABLE = os.getenv("AIRTABLE_PRICE_HISTORY_TABLE", "Price History")
+# Records per batched create/update call (Airtable allows at most 10)
+AIRTABLE_BATCH_SIZE = min(int(os.getenv("AIRTABLE_BATCH_SIZE", "10")), 10)
+# Requests/second across all Airtable calls (the API allows 5 per base)
+AIRTABLE_RATE = float(os.getenv("AIRTABLE_RATE", "4.5"))
+# Seconds to block every writer after a 429, and how often to retry one request
+AIRTABLE_429_PENALTY = float(os.getenv("AIRTABLE_429_PENALTY", "30"))
+AIRTABLE_429_RETRIES = int(os.getenv("AIRTABLE_429_RETRIES", "2"))
 
 # Shopify
 SHOPIFY_STORE_DOMAIN = os.getenv("SHOPIFY_STORE_DOMAIN", "feastitaly.com")
+SHOPIFY_TIMEOUT = float(os.getenv("SHOPIFY_TIMEOUT", "15"))
+# Number of per-host connection pools to cache, and max keep-alive connections per host
+SHOPIFY_POOL_CONNECTIONS = int(os.getenv("SHOPIFY_POOL_CONNECTIONS", "4"))
+SHOPIFY_POOL_MAXSIZE = int(os.getenv("SHOPIFY_POOL_MAXSIZE", "10"))
+# Default number of pipeline fetcher threads (main.py --workers)
+SHOPIFY_CONCURRENCY = int(os.getenv("SHOPIFY_CONCURRENCY", "8"))
+# Adaptive request rate (req/s) shared by all Shopify fetchers
+SHOPIFY_RATE = float(os.getenv("SHOPIFY_RATE", "4"))
+SHOPIFY_MIN_RATE = float(os.getenv("SHOPIFY_MIN_RATE", "0.5"))
+SHOPIFY_MAX_RATE = float(os.getenv("SHOPIFY_MAX_RATE", "10"))
+# Times a single request is retried after a 429 before giving up
+SHOPIFY_THROTTLE_RETRIES = int(os.getenv("SHOPIFY_THROTTLE_RETRIES", "3"))
+# Retries for timeouts / 5xx, with full-jitter exponential backoff (seconds)
+SHOPIFY_RETRIES = int(os.getenv("SHOPIFY_RETRIES", "3"))
+SHOPIFY_BACKOFF_BASE = float(os.getenv("SHOPIFY_BACKOFF_BASE", "0.5"))
+SHOPIFY_BACKOFF_MAX = float(os.getenv("SHOPIFY_BACKOFF_MAX", "10"))
+# Consecutive failures before a store domain's circuit opens, and how long it stays open
+SHOPIFY_BREAKER_THRESHOLD = int(os.getenv("SHOPIFY_BREAKER_THRESHOLD", "5"))
+SHOPIFY_BREAKER_COOLDOWN = float(os.getenv("SHOPIFY_BREAKER_COOLDOWN", "60"))
+# Comma-separated collections to price from in --bulk mode; empty = store-wide /products.json
+BULK_COLLECTIONS = [c.strip() for c in os.getenv("SHOPIFY_BULK_COLLECTIONS", "").split(",") if c.strip()]
+
+# Seconds between checks when running with --daemon
+CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", str(6 * 60 * 60)))
+# --adaptive scheduling: a price change within ADAPTIVE_VOLATILE_DAYS means checking
+# every run; the interval then grows to ADAPTIVE_MAX_INTERVAL_DAYS once the price
+# has held for ADAPTIVE_STABLE_DAYS
+ADAPTIVE_VOLATILE_DAYS = int(os.getenv("ADAPTIVE_VOLATILE_DAYS", "3"))
+ADAPTIVE_STABLE_DAYS = int(os.getenv("ADAPTIVE_STABLE_DAYS", "30"))
+ADAPTIVE_MAX_INTERVAL_DAYS = int(os.getenv("ADAPTIVE_MAX_INTERVAL_DAYS", "7"))
+# --changes-only: days after which an unchanged product still gets a heartbeat Price History row
+HEARTBEAT_DAYS = int(os.getenv("HEARTBEAT_DAYS", "7"))
+# Seconds of a --budget held back for the final write flush; the default leaves
+# room for one Airtable 429 penalty (Shopify requests stop at the deadline itself)
+BUDGET_RESERVE = float(os.getenv("BUDGET_RESERVE", str(AIRTABLE_429_PENALTY + 10)))
+# Capacity of each bounded queue between pipeline stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+
+# Local state (validator cache, checkpoints, journals)
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", ".state/monitor.db")
+# Send If-None-Match / If-Modified-Since for product JSON and reuse cached prices on 304
+SHOPIFY_HTTP_CACHE = os.getenv("SHOPIFY_HTTP_CACHE", "1") == "1"
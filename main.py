@@ -3,15 +3,34 @@
 Entry point: fetches prices for all products in the Airtable Products table,
 logs each check to Price History, and flags price drops so Airtable automations
 can handle notifications.
+
+Runs as a pipeline (see pipeline.py): Airtable pages are read on one thread,
+prices are fetched by --workers threads, and results are written back in
+batches of --write-batch records. With --daemon the process stays up and
+repeats the check every --interval seconds, keeping HTTP connections warm.
 """
 
+import argparse
 import logging
+import signal
 import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Optional
 
+import airtable_client
 import config  # noqa: F401 — ensures env vars are loaded early
-from scraper import fetch_price
+from pipeline import run_pipeline
+from state import Checkpoint, WriteJournal, run_window
+from scraper import DeadlineExceeded, ProductPrice, close_client, fetch_price, fetch_price_map, get_client
+from scheduling import SCHEDULE_FIELDS, AdaptiveSchedule, in_shard, parse_shard
 from airtable_client import (
-    get_monitored_products,
+    MONITOR_FIELDS,
+    PriceCheckWriter,
+    iter_monitored_products,
+    make_check_key,
     update_product,
     log_price_check,
 )
@@ -24,27 +43,120 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
-def check_product(record: dict) -> None:
-    """Check a single product for price changes.
+class _BufferedLog:
+    """Collects one product's log lines and emits them together.
+
+    Keeps output readable when several products are checked in parallel.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+        self._lines = []
+
+    def _add(self, level: int, msg: str, *args, **kwargs) -> None:
+        self._lines.append((level, msg, args, kwargs))
+
+    def info(self, msg: str, *args, **kwargs) -> None:
+        self._add(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg: str, *args, **kwargs) -> None:
+        self._add(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg: str, *args, **kwargs) -> None:
+        self._add(logging.ERROR, msg, *args, **kwargs)
+
+    def flush(self) -> None:
+        with self._lock:
+            for level, msg, args, kwargs in self._lines:
+                self._logger.log(level, msg, *args, **kwargs)
+        self._lines.clear()
+
+
+# Extra Products fields read and written by --changes-only mode
+CHANGE_FIELDS = ["Compare At Price", "Available", "Last Logged"]
+
+
+@dataclass
+class PriceCheck:
+    """Outcome of checking one product, ready to be written to Airtable."""
+    record_id: str
+    price: float
+    previous_price: Optional[float]
+    price_dropped: bool
+    checked_at: datetime
+    # False when nothing changed and no heartbeat is due (--changes-only)
+    log_history: bool = True
+    # Other Products fields to update alongside Current Price and Last Checked
+    product_fields: dict = field(default_factory=dict)
+    # The Products record's fields as read, so only changed fields are written
+    current_fields: Optional[dict] = None
+
+
+def _changes(fields: dict, price_data: ProductPrice) -> list[str]:
+    """What differs between a Products record and freshly fetched price data.
+
+    Airtable omits empty fields and unticked checkboxes, so a missing
+    Compare At Price reads as None and a missing Available as False.
+    """
+    changes = []
+    if fields.get("Current Price") != price_data.price:
+        changes.append("price")
+    if fields.get("Compare At Price") != price_data.compare_at_price:
+        changes.append("compare-at price")
+    if bool(fields.get("Available")) != price_data.available:
+        changes.append("availability")
+    return changes
+
+
+def _heartbeat_due(fields: dict, heartbeat_days: int, today: date) -> bool:
+    """True if the product's last Price History row is heartbeat_days old or more."""
+    try:
+        last_logged = date.fromisoformat((fields.get("Last Logged") or "")[:10])
+    except ValueError:
+        return True
+    return (today - last_logged).days >= heartbeat_days
+
+
+def evaluate_product(
+    record: dict,
+    price_data: ProductPrice = None,
+    plog: logging.Logger = None,
+    heartbeat_days: int = None,
+) -> Optional[PriceCheck]:
+    """Fetch a product's price and compare it with the last one seen.
 
     Args:
         record: An Airtable record dict from the Products table.
+        price_data: Price already fetched for this product. If omitted,
+            the price is fetched from Shopify here.
+        plog: Logger (or _BufferedLog) to write progress to. Defaults to the module logger.
+        heartbeat_days: Enables change-only history: a Price History row is
+            only logged if the price, compare-at price or availability
+            changed, or the last row is this many days old. The record
+            should include CHANGE_FIELDS. None logs every check.
+
+    Returns:
+        The PriceCheck to record, or None if the product has no Shopify Handle.
     """
+    plog = plog or log
     fields = record["fields"]
     name = fields.get("Name", "Unknown")
     handle = fields.get("Shopify Handle")
     previous_price = fields.get("Current Price")
 
     if not handle:
-        log.warning("Skipping product '%s' — no Shopify Handle set.", name)
-        return
+        plog.warning("Skipping product '%s' — no Shopify Handle set.", name)
+        return None
 
     # 1. Fetch current price from Shopify
-    log.info("Checking price for: %s", name)
-    price_data = fetch_price(handle)
+    plog.info("Checking price for: %s", name)
+    if price_data is None:
+        price_data = fetch_price(handle)
     current_price = price_data.price
 
-    log.info(
+    plog.info(
         "  %s — current: %s%.2f | previous: %s",
         name,
         price_data.currency,
@@ -58,51 +170,413 @@ def check_product(record: dict) -> None:
     )
 
     if price_dropped:
-        log.info(
+        plog.info(
             "  PRICE DROP detected! %s%.2f -> %s%.2f",
             price_data.currency, previous_price,
             price_data.currency, current_price,
         )
     elif previous_price is None:
-        log.info("  First check recorded.")
+        plog.info("  First check recorded.")
     else:
-        log.info("  No price change.")
+        plog.info("  No price change.")
 
-    # 3. Log to Price History table (Airtable automation will handle email if Price Dropped is true)
-    log_price_check(
-        product_record_id=record["id"],
+    check = PriceCheck(
+        record_id=record["id"],
         price=current_price,
         previous_price=previous_price,
         price_dropped=price_dropped,
+        checked_at=datetime.now(timezone.utc),
+        current_fields=fields,
     )
 
-    # 4. Update product's current price and last-checked timestamp
-    update_product(record["id"], current_price)
+    # Dates the last price change for --adaptive; also set on a product's
+    # first check (or first run with the field) so stability counts from then
+    today = check.checked_at.strftime("%Y-%m-%d")
+    if current_price != previous_price or not fields.get("Last Price Change"):
+        check.product_fields["Last Price Change"] = today
 
+    if heartbeat_days is not None:
+        changes = _changes(fields, price_data)
+        if changes:
+            plog.info("  Changed: %s.", ", ".join(changes))
+        elif _heartbeat_due(fields, heartbeat_days, check.checked_at.date()):
+            plog.info("  Unchanged; logging a heartbeat row.")
+        else:
+            plog.info("  Unchanged; no history row.")
+            check.log_history = False
+        check.product_fields["Compare At Price"] = price_data.compare_at_price
+        check.product_fields["Available"] = price_data.available
+        if check.log_history:
+            check.product_fields["Last Logged"] = today
 
-def main() -> None:
-    """Run the price check for all products in Airtable."""
-    log.info("=== Feast Italy Price Monitor ===")
+    return check
+
+
+def write_check(check: PriceCheck, writer: PriceCheckWriter = None, window: int = None) -> None:
+    """Record a PriceCheck in Airtable.
+
+    Args:
+        check: The result of evaluate_product().
+        writer: Buffered writer for the Price History row and product update.
+            If omitted, both are written immediately.
+        window: Run window length in seconds for the history row's Check Key.
+            Defaults to config.CHECK_INTERVAL.
+    """
+    # 3. Log to Price History table (Airtable automation will handle email if Price Dropped is true)
+    if check.log_history:
+        log_check = writer.log_price_check if writer else log_price_check
+        log_check(
+            product_record_id=check.record_id,
+            price=check.price,
+            previous_price=check.previous_price,
+            price_dropped=check.price_dropped,
+            checked_at=check.checked_at,
+            check_key=make_check_key(check.record_id, check.checked_at, window),
+        )
+
+    # 4. Update product's current price and last-checked timestamp (only what changed)
+    update = writer.update_product if writer else update_product
+    update(check.record_id, check.price, check.checked_at, check.product_fields or None, check.current_fields)
+
+
+def check_product(
+    record: dict,
+    price_data: ProductPrice = None,
+    plog: logging.Logger = None,
+    writer: PriceCheckWriter = None,
+) -> None:
+    """Check a single product for price changes and record the result.
+
+    See evaluate_product() and write_check() for the arguments.
+    """
+    check = evaluate_product(record, price_data, plog)
+    if check is not None:
+        write_check(check, writer)
+
+
+def _evaluate_one(
+    record: dict,
+    price_data: ProductPrice = None,
+    heartbeat_days: int = None,
+) -> Optional[PriceCheck]:
+    """Pipeline fetch stage: evaluate one record, keeping its log lines together."""
+    plog = _BufferedLog(log)
+    name = record.get("fields", {}).get("Name", record["id"])
+    try:
+        return evaluate_product(record, price_data, plog, heartbeat_days)
+    except DeadlineExceeded:
+        plog.info("Deferred '%s': the run's budget is spent.", name)
+        raise
+    except Exception as exc:
+        plog.error("Error checking '%s': %s", name, exc, exc_info=exc)
+        raise
+    finally:
+        plog.flush()
+
+
+def load_bulk_prices() -> dict[str, ProductPrice]:
+    """Price products from paginated collection (or store-wide) listings.
+
+    Returns an empty map if the listings can't be fetched, so every product
+    falls back to an individual request.
+    """
+    try:
+        prices = fetch_price_map(config.BULK_COLLECTIONS)
+    except Exception as exc:
+        log.warning("Bulk pricing failed, falling back to per-product requests: %s", exc)
+        return {}
+    log.info("Priced %d product(s) from listings.", len(prices))
+    return prices
+
+
+def parse_duration(value: str) -> int:
+    """Parse "300", "300s", "5m" or "1h" into seconds. Usable as an argparse type."""
+    units = {"s": 1, "m": 60, "h": 3600}
+    value = value.strip().lower()
+    multiplier = units.get(value[-1:], 1)
+    number = value[:-1] if value[-1:] in units else value
+    try:
+        seconds = int(float(number) * multiplier)
+    except (ValueError, OverflowError):
+        raise argparse.ArgumentTypeError(f"invalid duration {value!r}")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError("duration must be positive")
+    return seconds
 
-    products = get_monitored_products()
-    log.info("Found %d monitored product(s) to check.", len(products))
 
-    if not products:
+def positive_int(value: str) -> int:
+    """Parse an integer of at least 1. Usable as an argparse type."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Feast Italy price drop monitor.")
+    parser.add_argument(
+        "--workers",
+        type=positive_int,
+        default=config.SHOPIFY_CONCURRENCY,
+        help=f"Number of Shopify fetcher threads (default: {config.SHOPIFY_CONCURRENCY}).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=positive_int,
+        default=config.PIPELINE_QUEUE_SIZE,
+        help=f"Capacity of the queues between pipeline stages (default: {config.PIPELINE_QUEUE_SIZE}).",
+    )
+    parser.add_argument(
+        "--write-batch",
+        type=positive_int,
+        default=config.AIRTABLE_BATCH_SIZE,
+        help=f"Airtable records per batched write, at most 10 (default: {config.AIRTABLE_BATCH_SIZE}).",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Price products from collection listings, fetching individually only if missing.",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Only check products that are due, based on how long their price has held.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help="Only check products whose handle hashes to shard I of N (1-based), e.g. 2/4.",
+    )
+    parser.add_argument(
+        "--budget",
+        type=parse_duration,
+        metavar="DURATION",
+        help="Time limit for a run, e.g. 300s or 5m. Stalest products are checked first.",
+    )
+    parser.add_argument(
+        "--changes-only",
+        action="store_true",
+        help=(
+            "Only log a Price History row when the price, compare-at price or availability "
+            "changed, plus a heartbeat row every --heartbeat-days."
+        ),
+    )
+    parser.add_argument(
+        "--heartbeat-days",
+        type=int,
+        default=config.HEARTBEAT_DAYS,
+        help=f"Days between heartbeat rows for unchanged products with --changes-only (default: {config.HEARTBEAT_DAYS}).",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignore the checkpoint and recheck products already done in this run window.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and check prices every --interval seconds instead of once.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=parse_duration,
+        default=config.CHECK_INTERVAL,
+        help=(
+            "Time between checks in --daemon mode (e.g. 21600, 360m or 6h), and the length of the run window "
+            f"used for checkpoints (default: {config.CHECK_INTERVAL}s)."
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def run_once(args: argparse.Namespace, stop: threading.Event) -> int:
+    """Check every monitored product once.
+
+    Args:
+        args: Parsed command-line options.
+        stop: Event that, once set, ends the run early after flushing writes.
+
+    Returns:
+        Number of products that failed or were cancelled.
+    """
+    started = time.monotonic()
+    deadline = None
+    if args.budget:
+        # Keep some of the budget back for the final flush; Shopify requests
+        # still in flight are cut short at the deadline itself
+        reserve = min(config.BUDGET_RESERVE, args.budget / 2)
+        deadline = started + args.budget - reserve
+    # Set on every run (None without --budget), so the shared client never keeps a stale one
+    get_client().deadline = deadline
+    prices = load_bulk_prices() if args.bulk else {}
+    # Products already written in this run window (e.g. before a restart) are skipped
+    checkpoint = None if args.fresh else Checkpoint(run_window(args.interval))
+    done = checkpoint.done() if checkpoint else set()
+    journal = WriteJournal()
+    writer = PriceCheckWriter(
+        batch_size=min(args.write_batch, 10),
+        on_written=checkpoint.mark if checkpoint else None,
+        journal=journal,
+    )
+
+    # Writes an earlier run fetched but couldn't send go out before anything new
+    pending = len(journal.pending())
+    if pending:
+        log.info("Replaying %d journaled Airtable write(s) from an earlier run.", pending)
+        replayed = writer.replay(args.interval)
+        log.info("Replayed %d of %d journaled write(s).", replayed, pending)
+        if checkpoint:
+            done = checkpoint.done()
+
+    fields = list(MONITOR_FIELDS)
+    schedule = None
+    if args.adaptive:
+        schedule = AdaptiveSchedule()
+        fields += SCHEDULE_FIELDS
+    heartbeat_days = args.heartbeat_days if args.changes_only else None
+    if args.changes_only:
+        fields += CHANGE_FIELDS
+    fields = list(dict.fromkeys(fields))
+
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    # total: every monitored product; other_shards: those owned by other shards;
+    # checked_before: products in any shard whose Last Checked was already today;
+    # newly_checked: products this run wrote that weren't
+    counts = {"total": 0, "not_due": 0, "resumed": 0, "other_shards": 0, "checked_before": 0, "newly_checked": 0}
+
+    def _checked_today(fields: dict) -> bool:
+        return (fields.get("Last Checked") or "")[:10] == today
+
+    def _eligible():
+        for page in iter_monitored_products(fields):
+            log.info("Loaded %d monitored product(s) from Airtable.", len(page))
+            for record in page:
+                counts["total"] += 1
+                if _checked_today(record["fields"]):
+                    counts["checked_before"] += 1
+                if args.shard and not in_shard(record["fields"].get("Shopify Handle", ""), *args.shard):
+                    counts["other_shards"] += 1
+                elif record["id"] in done:
+                    counts["resumed"] += 1
+                elif schedule is None or schedule.is_due(record):
+                    yield record
+                else:
+                    counts["not_due"] += 1
+
+    def _records():
+        if not args.budget:
+            return _eligible()
+        # Stalest first (never-checked at the top), so a run cut short by the
+        # budget still reaches the products that have waited longest
+        records = list(_eligible())
+        records.sort(key=lambda r: r["fields"].get("Last Checked") or "")
+        return iter(records)
+
+    def _fetch(record: dict) -> Optional[PriceCheck]:
+        return _evaluate_one(record, prices.get(record["fields"].get("Shopify Handle")), heartbeat_days)
+
+    def _write(check: PriceCheck) -> None:
+        write_check(check, writer, args.interval)
+        if not _checked_today(check.current_fields or {}):
+            counts["newly_checked"] += 1
+
+    try:
+        stats = run_pipeline(
+            _records(),
+            fetch=_fetch,
+            write=_write,
+            flush=writer.flush,
+            fetchers=args.workers,
+            queue_size=args.queue_size,
+            stop=stop,
+            deadline=deadline,
+        )
+    finally:
+        journal.close()
+        if checkpoint:
+            checkpoint.close()
+
+    if counts["resumed"]:
+        log.info("Resumed: skipped %d product(s) already checked in this run window.", counts["resumed"])
+    if counts["not_due"]:
+        log.info("Skipped %d product(s) not yet due for a check.", counts["not_due"])
+    if writer.unchanged:
+        log.info("Skipped %d product update(s) with nothing changed.", writer.unchanged)
+
+    if not counts["total"] and not stats.errors:
         log.warning("No monitored products found. Tick the 'Monitor' checkbox in the '%s' table.", config.PRODUCTS_TABLE)
-        return
+        return 0
 
-    errors = 0
-    for record in products:
+    errors = stats.errors + writer.failed
+    log.info(
+        "Done. Checked %d product(s), %d error(s)%s.",
+        stats.fetched + stats.skipped, errors,
+        f", {stats.cancelled} cancelled" if stats.cancelled else "",
+    )
+    if args.budget and (stats.deferred or stats.fetched + stats.skipped + stats.errors < stats.read):
+        log.info("Budget of %ds spent; remaining product(s) are left for the next run.", args.budget)
+    if args.shard and counts["total"]:
+        index, count = args.shard
+        checked_today = counts["checked_before"] + counts["newly_checked"]
+        log.info(
+            "Shard %d/%d owns %d of %d product(s). Overall: %d/%d checked today (%.0f%%).",
+            index, count, counts["total"] - counts["other_shards"], counts["total"],
+            checked_today, counts["total"], 100 * checked_today / counts["total"],
+        )
+    return errors + stats.cancelled
+
+
+def run_daemon(args: argparse.Namespace, stop: threading.Event) -> None:
+    """Run checks every args.interval seconds until stop is set.
+
+    Shopify and Airtable clients are module-level singletons, so their
+    connections stay warm between runs. A run that overruns the interval
+    is followed immediately by the next one.
+    """
+    log.info("Daemon mode: checking every %ds.", args.interval)
+    while not stop.is_set():
+        started = time.monotonic()
         try:
-            check_product(record)
+            run_once(args, stop)
         except Exception as exc:
-            name = record.get("fields", {}).get("Name", record["id"])
-            log.error("Error checking '%s': %s", name, exc, exc_info=True)
-            errors += 1
+            log.error("Run failed: %s", exc, exc_info=True)
+        wait = args.interval - (time.monotonic() - started)
+        if wait > 0 and not stop.is_set():
+            log.info("Next check in %.0fs.", wait)
+            stop.wait(wait)
+
+
+def main(argv: list[str] = None) -> None:
+    """Run the price check for all products in Airtable."""
+    args = parse_args(argv)
+    log.info("=== Feast Italy Price Monitor ===")
+
+    # Stop reading and fetching on SIGTERM (Railway shutdown) / Ctrl-C, but
+    # still write every price already fetched
+    stop = threading.Event()
+
+    def _on_signal(signum, frame):
+        log.warning("Received %s, finishing pending writes.", signal.Signals(signum).name)
+        stop.set()
 
-    log.info("Done. Checked %d product(s), %d error(s).", len(products), errors)
+    previous_handlers = {sig: signal.signal(sig, _on_signal) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        if args.daemon:
+            run_daemon(args, stop)
+            failures = 0
+        else:
+            failures = run_once(args, stop)
+    finally:
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+        close_client()
+        airtable_client.close()
 
-    if errors:
+    if failures:
         sys.exit(1)
 
 
@@ -0,0 +1,161 @@
+"""Three-stage bounded-queue pipeline: read -> fetch -> write.
+
+A single reader thread pulls records from an iterable (Airtable pagination),
+a pool of fetcher threads turns each record into a result (Shopify request),
+and the calling thread acts as the writer, buffering results into batched
+Airtable writes. Bounded queues between the stages apply backpressure so
+memory stays flat however large the catalogue is.
+
+Setting the stop event (e.g. from a SIGTERM handler) stops the reader,
+lets the fetchers discard whatever is still queued, and the writer flushes
+every result it has already received before returning. A deadline does the
+same once it passes, counting the discarded records as deferred instead.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+# Marks the end of a stage's output on a queue
+_DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    """Counts from one pipeline run."""
+    read: int = 0
+    fetched: int = 0
+    skipped: int = 0
+    errors: int = 0
+    cancelled: int = 0
+    deferred: int = 0
+
+
+def run_pipeline(
+    source: Iterable,
+    fetch: Callable,
+    write: Callable,
+    flush: Callable[[], None],
+    fetchers: int = 4,
+    queue_size: int = 100,
+    stop: Optional[threading.Event] = None,
+    deadline: Optional[float] = None,
+) -> PipelineStats:
+    """Run records from `source` through `fetch` and `write`.
+
+    Args:
+        source: Iterable of records, consumed by the reader thread.
+        fetch: Called on a fetcher thread for each record. Returns a result
+            for the writer, or None to skip the record. An exception counts
+            as an error (or as deferred once the deadline has passed); fetch
+            is expected to have logged it.
+        write: Called on the calling thread for each result.
+        flush: Called once at the end, after the last write, even on error.
+        fetchers: Number of fetcher threads.
+        queue_size: Capacity of each queue between stages.
+        stop: Event that, once set, stops reading and fetching early.
+        deadline: time.monotonic() value after which no new fetches start.
+
+    Returns:
+        PipelineStats for the run.
+    """
+    stop = stop or threading.Event()
+    records: queue.Queue = queue.Queue(maxsize=queue_size)
+    results: queue.Queue = queue.Queue(maxsize=queue_size)
+    stats = PipelineStats()
+    lock = threading.Lock()
+    # Set when the writer exits, so stray threads wind down without
+    # touching the caller's stop event (which may be reused across runs)
+    finished = threading.Event()
+
+    def _stopping() -> bool:
+        return stop.is_set() or finished.is_set()
+
+    def _expired() -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _count(name: str) -> None:
+        with lock:
+            setattr(stats, name, getattr(stats, name) + 1)
+
+    def _put(q: queue.Queue, item) -> bool:
+        # Block for backpressure, but give up once stopped
+        while not _stopping() and not _expired():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _reader() -> None:
+        try:
+            for record in source:
+                if not _put(records, record):
+                    break
+                _count("read")
+        except Exception as exc:
+            log.error("Reading records failed: %s", exc, exc_info=True)
+            _count("errors")
+        finally:
+            for _ in range(fetchers):
+                records.put(_DONE)
+
+    def _fetcher() -> None:
+        while True:
+            record = records.get()
+            if record is _DONE:
+                break
+            if _stopping():
+                _count("cancelled")
+                continue
+            if _expired():
+                _count("deferred")
+                continue
+            try:
+                result = fetch(record)
+            except Exception:
+                # A fetch cut short by the deadline is left for the next run
+                _count("deferred" if _expired() else "errors")
+                continue
+            if result is None:
+                _count("skipped")
+                continue
+            _count("fetched")
+            # Unlike the reader, fetchers never drop finished work on stop:
+            # the writer keeps draining until every fetcher is done.
+            results.put(result)
+        results.put(_DONE)
+
+    threads = [threading.Thread(target=_reader, name="pipeline-reader", daemon=True)]
+    threads += [
+        threading.Thread(target=_fetcher, name=f"pipeline-fetcher-{i}", daemon=True)
+        for i in range(fetchers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        remaining = fetchers
+        while remaining:
+            result = results.get()
+            if result is _DONE:
+                remaining -= 1
+                continue
+            try:
+                write(result)
+            except Exception as exc:
+                log.error("Writing result failed: %s", exc, exc_info=True)
+                _count("errors")
+    finally:
+        finished.set()
+        flush()
+        for thread in threads:
+            thread.join(timeout=1)
+
+    return stats
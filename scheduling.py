@@ -0,0 +1,84 @@
+"""Deciding which monitored products a run should check.
+
+Sharding: with --shard I/N, each product belongs to exactly one of N shards
+by a stable hash of its Shopify Handle, so parallel workers split the
+catalogue without coordinating.
+
+Adaptive check frequency: with --adaptive, short-dated products and products
+whose price changed recently are checked on every run, while products whose
+price has held for a while are spread out to one check every few days.
+Stability is read from each product's Last Price Change date, which every
+check maintains on Products, so no Price History needs to be read.
+
+Decisions are made in whole days because Last Checked and Last Price Change
+only store dates.
+"""
+
+import argparse
+import hashlib
+from datetime import date, datetime, timezone
+from typing import Optional
+
+import config
+
+# Products fields the schedule reads (Last Checked and Last Price Change are
+# also in airtable_client.MONITOR_FIELDS)
+SCHEDULE_FIELDS = ["Last Checked", "Short Dated", "Last Price Change"]
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse an "I/N" shard spec (1 <= I <= N). Usable as an argparse type."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is outside 1..{count}")
+    return index, count
+
+
+def in_shard(handle: str, index: int, count: int) -> bool:
+    """True if the handle belongs to shard `index` of `count` (1-based).
+
+    Uses SHA-1 rather than hash() so the split is identical across processes.
+    """
+    digest = hashlib.sha1(handle.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count == index - 1
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+class AdaptiveSchedule:
+    """Decides which monitored products are due for a check today."""
+
+    def __init__(self, today: date = None):
+        self.today = today or datetime.now(timezone.utc).date()
+
+    def interval_days(self, record: dict) -> int:
+        """Days to wait between checks of this product (0 = every run)."""
+        fields = record["fields"]
+        if fields.get("Short Dated"):
+            return 0
+        last_change = _parse_date(fields.get("Last Price Change"))
+        if last_change is None:
+            return 0
+        stable_days = (self.today - last_change).days
+        if stable_days < config.ADAPTIVE_VOLATILE_DAYS:
+            return 0
+        # Scale linearly up to the max interval once the price has held for ADAPTIVE_STABLE_DAYS
+        stability = min(1.0, stable_days / max(config.ADAPTIVE_STABLE_DAYS, 1))
+        return round(config.ADAPTIVE_MAX_INTERVAL_DAYS * stability)
+
+    def is_due(self, record: dict) -> bool:
+        """True if the product has never been checked or its interval has elapsed."""
+        last_checked = _parse_date(record["fields"].get("Last Checked"))
+        if last_checked is None:
+            return True
+        return (self.today - last_checked).days >= self.interval_days(record)
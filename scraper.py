@@ -3,13 +3,28 @@
 Shopify stores expose product data at /products/<handle>.json,
 returning structured JSON with price, compare-at price, availability, etc.
 Collections are available at /collections/<handle>/products.json.
+
+The store domain may include a scheme (e.g. "http://127.0.0.1:8000") to point
+at a local stub. Concurrency comes from the caller (see pipeline.py); one
+ShopifyClient is safe to share between fetcher threads.
 """
 
-import requests
-from dataclasses import dataclass
+import logging
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
 from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
 
 import config
+from ratelimit import AdaptiveRateLimiter, parse_retry_after
+from state import ValidatorCache
+
+log = logging.getLogger(__name__)
 
 
 @dataclass
@@ -38,74 +53,324 @@ class CollectionProduct:
     url: str
 
 
+class CircuitOpenError(requests.RequestException):
+    """Raised without sending a request while a domain's circuit is open."""
+
+
+class DeadlineExceeded(requests.RequestException):
+    """Raised when a request or retry would run past the client's deadline."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one store domain.
+
+    After `threshold` consecutive failures the circuit opens and requests
+    fail immediately for `cooldown` seconds. The first request after the
+    cooldown is let through as a trial; success closes the circuit again.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def check(self, domain: str) -> None:
+        """Raise CircuitOpenError if requests to the domain should not be sent."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(
+                    f"Circuit open for {domain} after {self._failures} consecutive failures; "
+                    f"retrying in {remaining:.0f}s"
+                )
+            # Half-open: allow this request as a trial, re-open on the next failure
+            self._opened_at = None
+            self._failures = self.threshold - 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (1-based)."""
+    ceiling = min(config.SHOPIFY_BACKOFF_MAX, config.SHOPIFY_BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def _cap_timeout(timeout, remaining: Optional[float]):
+    """Shorten a requests timeout (seconds or a (connect, read) tuple) to `remaining`."""
+    if remaining is None or timeout is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(min(t, remaining) if t is not None else remaining for t in timeout)
+    return min(timeout, remaining)
+
+
+class ShopifyClient:
+    """Pooled HTTP client for a Shopify storefront.
+
+    Wraps a single requests.Session so consecutive product checks reuse
+    keep-alive connections instead of paying a TCP/TLS handshake each time.
+    Requests are paced by an adaptive rate limiter that backs off on 429
+    responses, transient failures are retried with jittered backoff, and a
+    per-domain circuit breaker fails fast while the store is down. Safe to
+    share between threads.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = None,
+        pool_maxsize: int = None,
+        timeout: float = None,
+        cache: ValidatorCache = None,
+        limiter: AdaptiveRateLimiter = None,
+    ):
+        """
+        Args:
+            pool_connections: Number of per-host connection pools to keep.
+                Defaults to config.SHOPIFY_POOL_CONNECTIONS.
+            pool_maxsize: Max keep-alive connections per host.
+                Defaults to config.SHOPIFY_POOL_MAXSIZE.
+            timeout: Request timeout in seconds. Defaults to config.SHOPIFY_TIMEOUT.
+            cache: Validator cache for conditional GETs of product JSON.
+                If None, product JSON is always downloaded in full.
+            limiter: Rate limiter shared by all requests through this client.
+                Defaults to one built from the SHOPIFY_*_RATE settings.
+        """
+        self.timeout = timeout or config.SHOPIFY_TIMEOUT
+        self.cache = cache
+        self.limiter = limiter or AdaptiveRateLimiter(
+            rate=config.SHOPIFY_RATE,
+            min_rate=config.SHOPIFY_MIN_RATE,
+            max_rate=config.SHOPIFY_MAX_RATE,
+        )
+        # time.monotonic() value after which get() stops sending and retrying
+        # (e.g. the end of a --budget run); None for no limit
+        self.deadline: Optional[float] = None
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections or config.SHOPIFY_POOL_CONNECTIONS,
+            pool_maxsize=pool_maxsize or config.SHOPIFY_POOL_MAXSIZE,
+        )
+        self.session = requests.Session()
+        self.session.headers.update({"Accept": "application/json"})
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def breaker(self, domain: str) -> CircuitBreaker:
+        """Return the circuit breaker for a store domain."""
+        with self._breakers_lock:
+            if domain not in self._breakers:
+                self._breakers[domain] = CircuitBreaker(
+                    config.SHOPIFY_BREAKER_THRESHOLD,
+                    config.SHOPIFY_BREAKER_COOLDOWN,
+                )
+            return self._breakers[domain]
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET a URL through the pooled session and raise on HTTP errors.
+
+        A 429 slows the shared limiter, waits out Retry-After and retries,
+        up to config.SHOPIFY_THROTTLE_RETRIES times. Timeouts, connection
+        errors and 5xx responses are retried up to config.SHOPIFY_RETRIES
+        times with jittered exponential backoff. With a deadline set, each
+        attempt's timeout and backoff are cut short to end by the deadline.
+
+        Raises:
+            CircuitOpenError: If the domain's circuit breaker is open.
+            DeadlineExceeded: If the deadline passes before a response arrives.
+            requests.RequestException: If the request still fails after retries.
+        """
+        timeout = kwargs.pop("timeout", self.timeout)
+        domain = urlparse(url).netloc
+        breaker = self.breaker(domain)
+        retries = 0
+        throttles = 0
+
+        while True:
+            breaker.check(domain)
+            self.limiter.acquire()
+            remaining = self._remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"Deadline passed before GET {url}")
+            try:
+                response = self.session.get(url, timeout=_cap_timeout(timeout, remaining), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if remaining is not None and self._remaining() <= 0:
+                    # Most likely our own shortened timeout, not the store's fault
+                    raise DeadlineExceeded(f"Deadline passed during GET {url}") from exc
+                breaker.record_failure()
+                if retries >= config.SHOPIFY_RETRIES:
+                    raise
+                retries += 1
+                log.debug("Retrying %s after %s (attempt %d)", url, exc, retries)
+                self._sleep(_backoff_delay(retries))
+                continue
+
+            if response.status_code == 429 and throttles < config.SHOPIFY_THROTTLE_RETRIES:
+                throttles += 1
+                self.limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                continue
+
+            if response.status_code >= 500:
+                breaker.record_failure()
+                if retries < config.SHOPIFY_RETRIES:
+                    retries += 1
+                    log.debug("Retrying %s after HTTP %d (attempt %d)", url, response.status_code, retries)
+                    self._sleep(_backoff_delay(retries))
+                    continue
+            elif response.status_code != 429:
+                breaker.record_success()
+                self.limiter.on_success()
+
+            response.raise_for_status()
+            return response
+
+    def _remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without one."""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def _sleep(self, seconds: float) -> None:
+        """Back off, waking no later than the deadline."""
+        remaining = self._remaining()
+        time.sleep(seconds if remaining is None else max(0.0, min(seconds, remaining)))
+
+    def get_json(self, url: str, **kwargs) -> dict:
+        """GET a URL and return the decoded JSON body."""
+        return self.get(url, **kwargs).json()
+
+    def close(self) -> None:
+        """Close all pooled connections and the validator cache."""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+_client: Optional[ShopifyClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ShopifyClient:
+    """Return the shared module-level ShopifyClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cache = ValidatorCache() if config.SHOPIFY_HTTP_CACHE else None
+                _client = ShopifyClient(cache=cache)
+    return _client
+
+
+def close_client() -> None:
+    """Close the shared ShopifyClient, if one was created."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _store_url(domain: str, path: str) -> str:
+    """Build a storefront URL, defaulting to https unless domain has a scheme."""
+    if "://" in domain:
+        return f"{domain.rstrip('/')}{path}"
+    return f"https://{domain}{path}"
+
+
+def _iter_listing(path: str, domain: str, client: ShopifyClient, limit: int):
+    """Yield raw product dicts from a paginated products.json listing."""
+    page = 1
+    while True:
+        url = _store_url(domain, f"{path}?limit={limit}&page={page}")
+        data = client.get_json(url)
+        batch = data.get("products", [])
+        if not batch:
+            break
+        yield from batch
+        page += 1
+
+
 def fetch_collection_products(
     collection_handle: str,
     domain: str = None,
+    client: ShopifyClient = None,
 ) -> list[CollectionProduct]:
     """Fetch all products from a Shopify collection.
 
     Args:
         collection_handle: The collection URL slug, e.g. "short-dated-but-delicious"
         domain: Shopify store domain. Defaults to config.SHOPIFY_STORE_DOMAIN.
+        client: ShopifyClient to use. Defaults to the shared client.
 
     Returns:
         List of CollectionProduct with basic product data.
     """
     domain = domain or config.SHOPIFY_STORE_DOMAIN
+    client = client or get_client()
     products = []
-    page = 1
-
-    while True:
-        url = f"https://{domain}/collections/{collection_handle}/products.json?limit=50&page={page}"
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-
-        data = response.json()
-        batch = data.get("products", [])
-        if not batch:
-            break
-
-        for p in batch:
-            variant = p["variants"][0]
-            compare_at = variant.get("compare_at_price")
-            products.append(CollectionProduct(
-                title=p["title"],
-                handle=p["handle"],
-                vendor=p.get("vendor", ""),
-                product_type=p.get("product_type", ""),
-                price=float(variant["price"]),
-                compare_at_price=float(compare_at) if compare_at else None,
-                currency=variant.get("price_currency", "GBP"),
-                url=f"https://{domain}/products/{p['handle']}",
-            ))
 
-        page += 1
+    for p in _iter_listing(f"/collections/{collection_handle}/products.json", domain, client, limit=50):
+        variant = p["variants"][0]
+        compare_at = variant.get("compare_at_price")
+        products.append(CollectionProduct(
+            title=p["title"],
+            handle=p["handle"],
+            vendor=p.get("vendor", ""),
+            product_type=p.get("product_type", ""),
+            price=float(variant["price"]),
+            compare_at_price=float(compare_at) if compare_at else None,
+            currency=variant.get("price_currency", "GBP"),
+            url=_store_url(domain, f"/products/{p['handle']}"),
+        ))
 
     return products
 
 
-def fetch_price(handle: str, domain: str = None) -> ProductPrice:
-    """Fetch current price for a product from Shopify's JSON endpoint.
+def fetch_price_map(
+    collections: list[str] = None,
+    domain: str = None,
+    client: ShopifyClient = None,
+) -> dict[str, ProductPrice]:
+    """Build a handle -> ProductPrice map from paginated product listings.
+
+    One listing request prices up to 250 products, versus one request per
+    handle with fetch_price().
 
     Args:
-        handle: The Shopify product handle (URL slug), e.g. "acacia-honey-and-almonds-170g"
+        collections: Collection handles to page through. If empty, the
+            store-wide /products.json listing is used instead.
         domain: Shopify store domain. Defaults to config.SHOPIFY_STORE_DOMAIN.
+        client: ShopifyClient to use. Defaults to the shared client.
 
     Returns:
-        ProductPrice with current pricing data.
-
-    Raises:
-        requests.HTTPError: If the request fails.
-        KeyError: If the JSON structure is unexpected.
+        Dict of ProductPrice keyed by product handle.
     """
     domain = domain or config.SHOPIFY_STORE_DOMAIN
-    url = f"https://{domain}/products/{handle}.json"
+    client = client or get_client()
+    paths = [f"/collections/{c}/products.json" for c in collections or []] or ["/products.json"]
 
-    response = requests.get(url, timeout=15)
-    response.raise_for_status()
+    prices = {}
+    for path in paths:
+        for p in _iter_listing(path, domain, client, limit=250):
+            prices[p["handle"]] = _parse_product(p)
+    return prices
 
-    data = response.json()
-    product = data["product"]
+
+def _parse_product(product: dict) -> ProductPrice:
+    """Parse a Shopify product dict (single-product or listing JSON) into ProductPrice."""
     variant = product["variants"][0]
 
     compare_at = variant.get("compare_at_price")
@@ -113,6 +378,15 @@ def fetch_price(handle: str, domain: str = None) -> ProductPrice:
     image_url = None
     if product.get("image") and product["image"].get("src"):
         image_url = product["image"]["src"]
+    elif product.get("images"):
+        image_url = product["images"][0].get("src")
+
+    # Listings omit inventory_quantity but carry an `available` flag instead
+    inventory_quantity = variant.get("inventory_quantity", 0)
+    if "inventory_quantity" in variant:
+        available = inventory_quantity > 0
+    else:
+        available = bool(variant.get("available", False))
 
     return ProductPrice(
         title=product["title"],
@@ -120,7 +394,54 @@ def fetch_price(handle: str, domain: str = None) -> ProductPrice:
         price=float(variant["price"]),
         compare_at_price=float(compare_at) if compare_at else None,
         currency=variant.get("price_currency", "GBP"),
-        available=variant.get("inventory_quantity", 0) > 0,
-        inventory_quantity=variant.get("inventory_quantity", 0),
+        available=available,
+        inventory_quantity=inventory_quantity,
         image_url=image_url,
     )
+
+
+def fetch_price(
+    handle: str,
+    domain: str = None,
+    client: ShopifyClient = None,
+) -> ProductPrice:
+    """Fetch current price for a product from Shopify's JSON endpoint.
+
+    Args:
+        handle: The Shopify product handle (URL slug), e.g. "acacia-honey-and-almonds-170g"
+        domain: Shopify store domain. Defaults to config.SHOPIFY_STORE_DOMAIN.
+        client: ShopifyClient to use. Defaults to the shared client.
+
+    If the client has a validator cache, the request is conditional and a
+    304 Not Modified reuses the previously parsed ProductPrice.
+
+    Returns:
+        ProductPrice with current pricing data.
+
+    Raises:
+        requests.HTTPError: If the request fails.
+        KeyError: If the JSON structure is unexpected.
+    """
+    domain = domain or config.SHOPIFY_STORE_DOMAIN
+    client = client or get_client()
+    url = _store_url(domain, f"/products/{handle}.json")
+
+    cached = client.cache.get(url) if client.cache is not None else None
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = client.get(url, headers=headers)
+    if response.status_code == 304 and cached:
+        return ProductPrice(**cached["payload"])
+
+    price = _parse_product(response.json()["product"])
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if client.cache is not None and (etag or last_modified):
+        client.cache.put(url, etag, last_modified, asdict(price))
+    return price
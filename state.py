@@ -0,0 +1,192 @@
+"""Local SQLite state kept between runs.
+
+Holds the conditional-GET validator cache for Shopify product JSON, the
+checkpoint of products already checked in the current run window, and the
+write-ahead journal of Airtable writes not yet confirmed. The database lives
+at config.STATE_DB_PATH. The cache and checkpoint are safe to delete at any
+time; deleting the journal loses any writes still waiting to be replayed.
+
+All of this only helps if the file survives between runs. Cron containers
+(e.g. Railway's) start with a fresh disk unless STATE_DB_PATH points into a
+mounted volume, so open_db() warns whenever it has to create the database.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import config
+
+log = logging.getLogger(__name__)
+
+
+def open_db(path: str = None) -> sqlite3.Connection:
+    """Open (creating if needed) the local state database.
+
+    The connection is in autocommit mode and may be shared between threads;
+    callers are responsible for serialising access with a lock.
+    """
+    path = path or config.STATE_DB_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path != ":memory:" and not os.path.exists(path):
+        log.warning(
+            "Creating local state at %s. If this appears on every run, the disk is not "
+            "persistent: point STATE_DB_PATH at a mounted volume to keep the HTTP cache, "
+            "checkpoint and write journal between runs.",
+            path,
+        )
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ValidatorCache:
+    """URL-keyed store of ETag / Last-Modified validators and parsed payloads."""
+
+    def __init__(self, path: str = None):
+        self._lock = threading.Lock()
+        self._conn = open_db(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                payload TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    def get(self, url: str) -> Optional[dict]:
+        """Return {"etag", "last_modified", "payload"} for a URL, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, payload FROM http_cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, payload = row
+        return {"etag": etag, "last_modified": last_modified, "payload": json.loads(payload)}
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], payload: dict) -> None:
+        """Store validators and the parsed payload for a URL."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(payload), time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def run_window(length: int, now: float = None) -> str:
+    """Label for the `length`-second window containing `now`, e.g. "2026-10-15T06:00".
+
+    Windows are aligned to the Unix epoch, so 6-hour windows start at
+    00:00, 06:00, 12:00 and 18:00 UTC, matching the cron schedule.
+    """
+    now = time.time() if now is None else now
+    start = int(now // length) * length
+    return datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%dT%H:%M")
+
+
+class Checkpoint:
+    """Record IDs already checked and written during one run window.
+
+    A run that is killed and restarted within the same window skips those
+    products instead of fetching them again and logging duplicate history.
+    Entries from older windows are pruned on open.
+    """
+
+    def __init__(self, window: str, path: str = None):
+        self.window = window
+        self._lock = threading.Lock()
+        self._conn = open_db(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoint (
+                window TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                PRIMARY KEY (window, record_id)
+            )"""
+        )
+        self._conn.execute("DELETE FROM checkpoint WHERE window != ?", (window,))
+
+    def done(self) -> set[str]:
+        """Record IDs already completed in this window."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record_id FROM checkpoint WHERE window = ?", (self.window,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark(self, record_ids: Iterable[str]) -> None:
+        """Record products whose check has been written to Airtable."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO checkpoint VALUES (?, ?)",
+                [(self.window, record_id) for record_id in record_ids],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WriteJournal:
+    """Append-only journal of pending Airtable writes.
+
+    Each write is appended before it is sent and removed once Airtable has
+    accepted it, so anything left over after a failure or crash can be
+    replayed by the next run instead of refetching prices.
+    """
+
+    def __init__(self, path: str = None):
+        self._lock = threading.Lock()
+        self._conn = open_db(path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS write_journal (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+
+    def append(self, kind: str, payload: dict) -> int:
+        """Journal one pending write and return its entry ID."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO write_journal (kind, payload, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(payload), time.time()),
+            )
+            return cursor.lastrowid
+
+    def remove(self, entry_ids: Iterable[Optional[int]]) -> None:
+        """Drop entries whose writes have been confirmed."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM write_journal WHERE id = ?",
+                [(entry_id,) for entry_id in entry_ids if entry_id is not None],
+            )
+
+    def pending(self) -> list[tuple[int, str, dict]]:
+        """All unconfirmed writes as (id, kind, payload), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, kind, payload FROM write_journal ORDER BY id"
+            ).fetchall()
+        return [(entry_id, kind, json.loads(payload)) for entry_id, kind, payload in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
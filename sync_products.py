@@ -13,7 +13,7 @@ import sys
 
 import config  # noqa: F401
 from scraper import fetch_collection_products
-from airtable_client import upsert_product
+from airtable_client import create_products, get_handle_index
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,37 +26,36 @@ DEFAULT_COLLECTION = "short-dated-but-delicious"
 
 
 def sync(collection_handle: str) -> None:
-    """Fetch all products from a collection and upsert them into Airtable."""
+    """Fetch all products from a collection and add any missing ones to Airtable.
+
+    Existing handles are loaded once into an in-memory index and diffed
+    locally, so only new products cost write requests.
+    """
     log.info("Fetching products from collection: %s", collection_handle)
 
     products = fetch_collection_products(collection_handle)
     log.info("Found %d product(s) on Shopify.", len(products))
 
-    added = 0
-    skipped = 0
+    index = get_handle_index()
+    log.info("Loaded %d existing product(s) from Airtable.", len(index))
 
+    skipped = 0
+    missing = {}
     for p in products:
-        result = upsert_product(
-            name=p.title,
-            handle=p.handle,
-            url=p.url,
-            price=p.price,
-            vendor=p.vendor,
-        )
-        if result.get("createdTime"):
-            # Freshly created records have createdTime very close to now,
-            # but both new and existing records have it — check if fields
-            # were returned with a Shopify Handle (existing) or not.
-            pass
-
-        # If the record already had a Shopify Handle, it existed before
-        existing_handle = result.get("fields", {}).get("Shopify Handle", "")
-        if existing_handle == p.handle:
+        if p.handle in index or p.handle in missing:
             log.info("  [exists] %s", p.title)
             skipped += 1
         else:
-            log.info("  [added]  %s", p.title)
-            added += 1
+            missing[p.handle] = p
+
+    created = create_products([
+        {"name": p.title, "handle": p.handle, "url": p.url, "price": p.price, "vendor": p.vendor}
+        for p in missing.values()
+    ])
+    for record in created:
+        log.info("  [added]  %s", record["fields"].get("Name", ""))
+
+    added = len(created)
 
     log.info(
         "Sync complete. %d added, %d already existed.",
@@ -0,0 +1,213 @@
+"""Tests for buffered/journaled Airtable writes, with Airtable stubbed out.
+
+Run with: python -m unittest discover tests
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+# config.py requires Airtable credentials at import time
+os.environ.setdefault("AIRTABLE_API_KEY", "test")
+os.environ.setdefault("AIRTABLE_BASE_ID", "test")
+
+import requests  # noqa: E402
+
+import airtable_client  # noqa: E402
+from airtable_client import PriceCheckWriter, changed_fields, log_price_checks  # noqa: E402
+from state import WriteJournal  # noqa: E402
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+class _FakeTable:
+    """In-memory stand-in for a pyairtable Table."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.records: dict[str, dict] = {}
+        self.created = 0
+        self.updated = 0
+
+    def all(self, formula: str = None, fields: list[str] = None) -> list[dict]:
+        rows = [r for r in self.records.values() if f"'{r['fields'].get('Check Key')}'" in (formula or "")]
+        return [{"id": r["id"], "fields": {k: v for k, v in r["fields"].items() if not fields or k in fields}} for r in rows]
+
+    def batch_create(self, records: list[dict]) -> list[dict]:
+        created = []
+        for fields in records:
+            record = {"id": f"rec{len(self.records)}", "fields": dict(fields)}
+            self.records[record["id"]] = record
+            created.append(record)
+        self.created += len(created)
+        return created
+
+    def batch_update(self, records: list[dict]) -> list[dict]:
+        for r in records:
+            self.records[r["id"]]["fields"].update(r["fields"])
+        self.updated += len(records)
+        return [self.records[r["id"]] for r in records]
+
+
+class _AirtableTestCase(unittest.TestCase):
+    def setUp(self):
+        # Failed-write and state-creation warnings are expected here
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        airtable_client._missing_fields.clear()
+        patcher = mock.patch.object(airtable_client, "_products_table", return_value=_FakeTable("Products"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class WriterReplayTest(_AirtableTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.journal = WriteJournal(os.path.join(self.tmp, "state.db"))
+        self.addCleanup(self.journal.close)
+        self.now = datetime.now(timezone.utc)
+        self.today = self.now.strftime("%Y-%m-%d")
+        self.sent: list[tuple[str, dict]] = []
+        self.marked: list[str] = []
+
+    def _journal_update(self, record_id: str, checked_at: datetime, price: float) -> None:
+        writer = PriceCheckWriter(batch_size=10, journal=self.journal)
+        writer.update_product(record_id, price, checked_at)
+
+    def _replay(self, last_checked: dict, send=None) -> PriceCheckWriter:
+        writer = PriceCheckWriter(batch_size=10, on_written=self.marked.extend, journal=self.journal)
+        with mock.patch.object(airtable_client, "get_last_checked", return_value=last_checked), \
+                mock.patch.object(airtable_client, "update_product_fields", side_effect=send or self.sent.extend):
+            writer.replay(window=6 * 60 * 60)
+        return writer
+
+    def test_same_day_update_is_resent(self):
+        self._journal_update("recA", self.now, 9.0)
+        self._replay({"recA": self.today})
+        self.assertEqual([record_id for record_id, _ in self.sent], ["recA"])
+        self.assertEqual(self.journal.pending(), [])
+
+    def test_update_from_an_earlier_day_than_last_checked_is_dropped(self):
+        self._journal_update("recA", self.now - timedelta(days=2), 9.0)
+        self._replay({"recA": self.today})
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.journal.pending(), [])
+
+    def test_only_newest_update_per_existing_product_is_sent(self):
+        self._journal_update("recA", self.now - timedelta(hours=1), 9.0)
+        self._journal_update("recA", self.now, 8.0)
+        self._journal_update("recGone", self.now, 7.0)
+        self._replay({"recA": None})
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][1]["Current Price"], 8.0)
+
+    def test_only_current_window_updates_are_checkpointed(self):
+        self._journal_update("recNow", self.now, 9.0)
+        self._journal_update("recOld", self.now - timedelta(days=1), 9.0)
+        self._replay({"recNow": None, "recOld": None})
+        self.assertEqual(len(self.sent), 2)
+        self.assertEqual(self.marked, ["recNow"])
+
+    def test_auth_failure_keeps_updates_journaled(self):
+        self._journal_update("recA", self.now, 9.0)
+        self._journal_update("recB", self.now, 8.0)
+
+        def _unauthorized(updates):
+            raise _http_error(401)
+
+        writer = self._replay({"recA": None, "recB": None}, send=_unauthorized)
+        self.assertEqual(writer.failed, 2)
+        self.assertEqual(len(self.journal.pending()), 2)
+        self.assertEqual(self.marked, [])
+
+    def test_rejected_record_is_dropped_and_the_rest_resent_one_by_one(self):
+        for record_id in ("recA", "recBad", "recC"):
+            self._journal_update(record_id, self.now, 9.0)
+
+        def _reject_bad(updates):
+            if any(record_id == "recBad" for record_id, _ in updates):
+                raise _http_error(422)
+            self.sent.extend(updates)
+
+        writer = self._replay({"recA": None, "recBad": None, "recC": None}, send=_reject_bad)
+        self.assertEqual(sorted(record_id for record_id, _ in self.sent), ["recA", "recC"])
+        self.assertEqual(writer.failed, 1)
+        self.assertEqual(self.journal.pending(), [])
+
+    def test_unchanged_update_is_skipped_but_checkpointed(self):
+        writer = PriceCheckWriter(batch_size=10, on_written=self.marked.extend, journal=self.journal)
+        current = {"Current Price": 9.0, "Last Checked": self.today}
+        writer.update_product("recA", 9.0, self.now, current=current)
+        self.assertEqual(writer.unchanged, 1)
+        self.assertEqual(self.marked, ["recA"])
+        self.assertEqual(self.journal.pending(), [])
+
+
+class ChangedFieldsTest(unittest.TestCase):
+    def test_missing_fields_match_empty_values(self):
+        fields = {"Compare At Price": None, "Available": False, "Note": ""}
+        self.assertEqual(changed_fields({}, fields), {})
+
+    def test_only_differing_fields_are_returned(self):
+        record = {"Current Price": 9.0, "Last Checked": "2026-10-15", "Available": True}
+        fields = {"Current Price": 8.0, "Last Checked": "2026-10-15", "Available": True, "Compare At Price": 0.0}
+        self.assertEqual(changed_fields(record, fields), {"Current Price": 8.0, "Compare At Price": 0.0})
+
+
+class LogPriceChecksTest(_AirtableTestCase):
+    def setUp(self):
+        super().setUp()
+        self.table = _FakeTable("Price History")
+        patcher = mock.patch.object(airtable_client, "_price_history_table", return_value=self.table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.checked_at = datetime.now(timezone.utc)
+
+    def _check(self, key: str, price: float, previous: float) -> dict:
+        return {
+            "product_record_id": "recP",
+            "price": price,
+            "previous_price": previous,
+            "price_dropped": price < previous,
+            "checked_at": self.checked_at,
+            "check_key": key,
+        }
+
+    def _row(self, key: str) -> dict:
+        return next(r["fields"] for r in self.table.records.values() if r["fields"]["Check Key"] == key)
+
+    def test_later_check_never_overwrites_a_drop(self):
+        log_price_checks([self._check("recP:w", 8.0, 10.0)])
+        log_price_checks([self._check("recP:w", 8.0, 8.0)])
+        self.assertEqual(len(self.table.records), 1)
+        self.assertTrue(self._row("recP:w")["Price Dropped"])
+        self.assertEqual(self._row("recP:w")["Previous Price"], 10.0)
+
+    def test_drop_upgrades_an_existing_row(self):
+        log_price_checks([self._check("recP:w", 8.0, 8.0)])
+        log_price_checks([self._check("recP:w", 6.0, 8.0)])
+        self.assertEqual(self.table.updated, 1)
+        self.assertTrue(self._row("recP:w")["Price Dropped"])
+
+    def test_duplicate_keys_in_a_batch_keep_the_drop(self):
+        log_price_checks([
+            self._check("recP:w", 5.0, 5.0),
+            self._check("recP:w", 4.0, 5.0),
+            self._check("recP:w", 4.0, 4.0),
+        ])
+        self.assertEqual(self.table.created, 1)
+        self.assertTrue(self._row("recP:w")["Price Dropped"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Fetch-stage tests against a local stub Shopify server.
+
+Run with: python -m unittest discover tests
+"""
+
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# config.py requires Airtable credentials at import time
+os.environ.setdefault("AIRTABLE_API_KEY", "test")
+os.environ.setdefault("AIRTABLE_BASE_ID", "test")
+
+import requests  # noqa: E402
+
+from pipeline import run_pipeline  # noqa: E402
+from ratelimit import AdaptiveRateLimiter  # noqa: E402
+from scraper import ShopifyClient, fetch_price  # noqa: E402
+
+PRICES = {f"product-{i}": 10.0 + i for i in range(12)}
+DELAY = 0.1
+
+
+class _StubShopify(BaseHTTPRequestHandler):
+    """Serves /products/<handle>.json from PRICES and tracks concurrency."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(DELAY)
+            handle = self.path.rsplit("/", 1)[-1].removesuffix(".json")
+            if handle not in PRICES:
+                self._send(404, {"errors": "Not Found"})
+                return
+            variant = {"price": f"{PRICES[handle]:.2f}", "compare_at_price": None, "inventory_quantity": 5}
+            self._send(200, {"product": {"title": handle, "handle": handle, "variants": [variant]}})
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def _send(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchStageTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubShopify)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.domain = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _StubShopify.max_in_flight = 0
+        limiter = AdaptiveRateLimiter(rate=1000, min_rate=1000, max_rate=1000, burst=1000)
+        self.client = ShopifyClient(cache=None, limiter=limiter)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_fetch_price_parses_product(self):
+        price = fetch_price("product-3", self.domain, self.client)
+        self.assertEqual(price.handle, "product-3")
+        self.assertEqual(price.price, 13.0)
+        self.assertTrue(price.available)
+
+    def test_missing_product_raises(self):
+        with self.assertRaises(requests.HTTPError):
+            fetch_price("no-such-product", self.domain, self.client)
+
+    def test_pipeline_fetches_concurrently(self):
+        handles = list(PRICES) + ["no-such-product"]
+        fetched = {}
+
+        stats = run_pipeline(
+            handles,
+            fetch=lambda handle: fetch_price(handle, self.domain, self.client),
+            write=lambda price: fetched.__setitem__(price.handle, price.price),
+            flush=lambda: None,
+            fetchers=6,
+        )
+
+        self.assertEqual(fetched, PRICES)
+        self.assertEqual(stats.errors, 1)
+        self.assertGreater(_StubShopify.max_in_flight, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()